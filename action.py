@@ -1,27 +1,30 @@
 # Hybrid control: Mouse for game setup, Keyboard for gameplay
 
-import pyautogui
 import time
 import numpy as np
+from backends import BackendError, get_backend
 
 class GameSetup():
     """Handles game initialization using mouse controls"""
     
-    def __init__(self):
-        pyautogui.PAUSE = 0.01
+    def __init__(self, backend=None):
+        self.backend = get_backend(backend)
+        self.backend.set_pause(0.01)
         
     def find_and_click_button(self, image_path, confidence=0.7):
         """Find and click a button using image recognition"""
         try:
-            button_location = pyautogui.locateOnScreen(image_path, confidence=confidence)
+            button_location = self.backend.locate(image_path, confidence=confidence, grayscale=False)
             if button_location:
-                center = pyautogui.center(button_location)
+                center = self.backend.center(button_location)
                 print(f"Found button at: {center}")
-                pyautogui.click(center)
+                self.backend.click(*center)
                 return True
             else:
                 print(f"Button not found: {image_path}")
                 return False
+        except BackendError:
+            raise
         except Exception as e:
             print(f"Error finding button: {e}")
             return False
@@ -32,12 +35,12 @@ class GameSetup():
         
         # Click start button
         if self.find_and_click_button(start_button_path):
-            time.sleep(1)  # Wait for game to load
+            self.backend.sleep(1)  # Wait for game to load
             
             # Click play button if provided
             if play_button_path:
                 self.find_and_click_button(play_button_path)
-                time.sleep(0.5)
+                self.backend.sleep(0.5)
             
             print("Game setup complete!")
             return True
@@ -46,10 +49,10 @@ class GameSetup():
 class GameController():
     """Handles gameplay using keyboard controls only"""
     
-    def __init__(self):
+    def __init__(self, backend=None):
         # No coordinates needed for keyboard control
-        pyautogui.PAUSE = 0.01
-        pyautogui.FAILSAFE = False
+        self.backend = get_backend(backend)
+        self.backend.set_pause(0.01)
         
     def perform(self, action_code):
         """Perform game action using keyboard only"""
@@ -60,7 +63,7 @@ class GameController():
         print(f"Performing keyboard action: {action_code}")
         
         if action_code == 0:  # Do nothing
-            time.sleep(0.1)
+            self.backend.sleep(0.1)
             return
             
         # Define keyboard actions using arrow keys
@@ -73,8 +76,8 @@ class GameController():
         
         if action_code in keyboard_actions:
             key = keyboard_actions[action_code]
-            pyautogui.press(key)
-            time.sleep(0.05)  # Short delay to allow game to respond
+            self.backend.press(key)
+            self.backend.sleep(0.05)  # Short delay to allow game to respond
         else:
             print(f"Unknown action: {action_code}")
 
@@ -82,10 +85,10 @@ class GameController():
 class action():
     """Compatibility wrapper that ignores coordinates and uses keyboard"""
     
-    def __init__(self, left=0, top=0, width=0, height=0):
+    def __init__(self, left=0, top=0, width=0, height=0, backend=None):
         # Ignore all coordinate parameters
         print("Action class initialized - using keyboard controls (coordinates ignored)")
-        self.controller = GameController()
+        self.controller = GameController(backend)
         
     def perform(self, action_code):
         """Delegate to keyboard controller"""
@@ -102,7 +105,7 @@ if __name__ == "__main__":
     
     if game_ready:
         # Step 2: Gameplay (Keyboard control)
-        controller = GameController()
+        controller = GameController(setup.backend)
         
         print("Starting gameplay with keyboard controls...")
         # Test gameplay actions
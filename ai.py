@@ -1,4 +1,5 @@
 # Importing the libraries
+import sys
 import time
 import numpy as np
 import os
@@ -7,8 +8,6 @@ import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
 from torch.autograd import Variable
-import matplotlib.pyplot as pyplot
-import pandas as pd
 
 # Importing the other Python files
 from env import env
@@ -17,6 +16,8 @@ import replay_memory
 import neural_net
 from eligibility_trace import eligibility_trace
 import moving_avg
+from checkpoint import CheckpointManager
+from runtime import RuntimeConfig
 
 #If OMP Error comes then paste following commands to python console
 '''
@@ -25,79 +26,131 @@ import os
 os.environ['KMP_DUPLICATE_LIB_OK']='True'
 '''
 
-# Getting the Subway Surfers environment
-senv = env()
-number_actions = senv.action_space
+# Hyperparameters used by default, any of them can be overridden by the config given to train (see sweep.py).
+DEFAULTS = {
+    'n_step': 7, #Number of steps to look forward
+    'capacity': 5000, #Size of the replay memory
+    'T': 10, #Softmax temperature
+    'lr': 0.005, #Learning rate of the Adam optimizer
+    'gamma': 0.99, #Discount of the rewards in the eligibility trace
+    'batch_size': 64,
+    'steps_per_epoch': 128, #Number of n_steps samples collected per epoch
+    'nb_epochs': 200, #Modify this to get better results (We were able to train only for 20 epochs at once)
+    'ma_size': 500, #Moving average used to grade our model
+    'replay_every': 10, #Save the replay memory every this many epochs (and when training stops)
+}
 
-# Building an AI
-cnn = neural_net.CNN(number_actions)
-softmax_body = neural_net.SoftmaxBody(T = 10)
-ai = neural_net.AI(body = softmax_body, brain = cnn)
+# Training the AI.
+# config: hyperparameters overriding DEFAULTS. backend: display/input backend given to env (see backends.py).
+# checkpoint_dir: folder of the checkpoints, None to disable them. resume: start from the latest checkpoint.
+# max_seconds: stop after this much wall clock time. runtime: thread settings of acting and learning
+# (default: runtime_config.json, see runtime.py). Returns the history of the epochs as a list of dictionaries.
+def train(config = None, backend = None, checkpoint_dir = 'checkpoints', resume = False, max_seconds = None, runtime = None):
+    config = dict(DEFAULTS, **(config or {}))
+    runtime = runtime or RuntimeConfig.load()
+    runtime.setup()
 
-# Setting up Experience Replay and n_step progress
-n_steps = n_step.NStepProgress(ai = ai, env = senv, n_step = 7)
-memory = replay_memory.ReplayMemory(n_steps = n_steps, capacity = 5000)
+    # Getting the Subway Surfers environment
+    senv = env(backend)
+    number_actions = senv.action_space
 
-ma = moving_avg.MA(500) #Moving average used to grade our model
+    # Building an AI
+    cnn = neural_net.CNN(number_actions)
+    softmax_body = neural_net.SoftmaxBody(T = config['T'])
+    ai = neural_net.AI(body = softmax_body, brain = cnn)
 
-# Functions to save and load the checkpoints created while training.
-def load():
-    if os.path.isfile('old_brain.pth'):
-        print("=> loading checkpoint... ")
+    # Setting up Experience Replay and n_step progress
+    n_steps = n_step.NStepProgress(ai = ai, env = senv, n_step = config['n_step'])
+    memory = replay_memory.ReplayMemory(n_steps = n_steps, capacity = config['capacity'])
+
+    ma = moving_avg.MA(config['ma_size']) #Moving average used to grade our model
+
+    optimizer = optim.Adam(cnn.parameters(), lr = config['lr']) #Using Adam optimizer
+    loss = nn.MSELoss() #Using Mean Squared Error loss
+
+    # Checkpoints are written in the background to the checkpoints folder, keeping the last 3 and the best one.
+    checkpoints = CheckpointManager(checkpoint_dir, keep_last = 3, resume = resume) if checkpoint_dir else None
+    start_epoch = load(checkpoints, cnn, optimizer, memory, ma) if resume else 1
+
+    #Training begins here!
+    history = []
+    start_time = time.perf_counter()
+    replay_saved = False #The replay memory on disk is up to date
+    try:
+        for epoch in range(start_epoch, config['nb_epochs'] + 1):
+            replay_saved = False
+            print("Playing game for Epoch : %s" %str(epoch))
+            print("Printing actions")
+
+            # CRITICAL FIX: Reset environment properly at start of each epoch
+            print("Resetting environment for new epoch...")
+
+            with runtime.role('acting'): #Batch 1 forward passes, few threads
+                memory.run_steps(config['steps_per_epoch']) #Calling n_steps and filling the buffer
+            print("Entering Epoch :")
+            with runtime.role('learning'): #Minibatch forward and backward passes
+                for batch in memory.sample_batch(config['batch_size']): #Randomly choosing samples
+                    inputs, targets = eligibility_trace(batch, cnn, gamma = config['gamma']) # Calculate Target Qvalues for comparision and evaluating our model.
+                    inputs, targets = Variable(inputs), Variable(targets)
+                    predictions, hidden = cnn(inputs, None)
+                    loss_error = loss(predictions, targets) #Calculating loss
+                    optimizer.zero_grad() #Setting gradients to zero
+                    loss_error.backward() #Doing back propagation
+                    optimizer.step() #Updating weights
+
+            #Evaluating our model on games played in this epoch
+            rewards_steps = n_steps.rewards_steps()
+            ma.add(rewards_steps)
+            avg_reward = ma.average() #Calculating average of rewards
+            print("Epoch: %s, Average Reward: %s" % (str(epoch), str(avg_reward))) #Output for each epoch
+            stats = ma.summary()
+            print("Min: %s, Max: %s, Median: %s, EMA: %s" % (stats['min'], stats['max'], stats['p50'], stats['ema']))
+            print("Skipped on static frames: %s detections, %s preprocessings, %s forward passes"
+                  % (senv.skipped['detection'], senv.skipped['preprocess'], n_steps.skipped_forwards))
+            elapsed = time.perf_counter() - start_time
+            history.append({'epoch': epoch, 'time': elapsed, 'steps': n_steps.steps,
+                            'steps_per_second': n_steps.steps / elapsed if elapsed > 0 else 0.0,
+                            'avg_reward': avg_reward, 'episodes': len(rewards_steps)})
+            if checkpoints is not None:
+                save_replay = epoch % config['replay_every'] == 0 #The replay memory is large, it is not saved every epoch
+                checkpoints.save(epoch, cnn, optimizer, score = avg_reward, memory = memory if save_replay else None, ma = ma) #Saving current model (the best one is kept separately)
+                replay_saved = save_replay
+            #Note: these rewards are not the scores displayed at the end of games. They are the number of steps taken*2 and still the agent is alive
+            if avg_reward >= 20: #Checking for some milestones
+                print("20 reached")
+            if avg_reward >= 50: #Checking for some milestones
+                print("50 reached")
+            if avg_reward >= 100: #This score is really great
+                print("Congratulations!")
+                break
+            if max_seconds is not None and elapsed >= max_seconds:
+                break
+    finally:
+        if checkpoints is not None:
+            try:
+                if not replay_saved:
+                    checkpoints.save_replay(memory) #Latest replay memory, used by --resume
+            finally:
+                checkpoints.close() #Waiting for the last checkpoints to be written
+    return history
+
+# Functions to load the checkpoints created while training.
+# Returns the epoch to start training from.
+def load(checkpoints, cnn, optimizer, memory, ma):
+    print("=> loading checkpoint... ")
+    checkpoint = checkpoints.load(cnn, optimizer, memory = memory, ma = ma) if checkpoints is not None else None
+    if checkpoint is not None:
+        print("done !")
+        return checkpoint['epoch'] + 1
+    elif os.path.isfile('old_brain.pth'): #Checkpoint saved by older versions
         checkpoint = torch.load('old_brain.pth')
         cnn.load_state_dict(checkpoint['state_dict'])
         optimizer.load_state_dict(checkpoint['optimizer'])
         print("done !")
     else:
         print("no checkpoint found...")
-        
-def save():
-        torch.save({'state_dict': cnn.state_dict(),
-                    'optimizer' : optimizer.state_dict(),
-                   }, 'old_brain.pth')
-
-
-# Training the AI
-nb_epochs = 200 #Modify this to get better results (We were able to train only for 20 epochs at once)
-optimizer = optim.Adam(cnn.parameters(), lr = 0.005) #Using Adam optimizer
-loss = nn.MSELoss() #Using Mean Squared Error loss
-
-#Uncomment if you have old_brain to use
-#load() 
-
-#Training begins here!
-for epoch in range(1, nb_epochs + 1):
-    print("Playing game for Epoch : %s" %str(epoch))
-    print("Printing actions")
-    
-    # CRITICAL FIX: Reset environment properly at start of each epoch
-    print("Resetting environment for new epoch...")
-    
-    memory.run_steps(128) #Calling n_steps 128 times and filling the buffer
-    print("Entering Epoch :")
-    for batch in memory.sample_batch(64): #Randomly choosing 64 samples
-        inputs, targets = eligibility_trace(batch, cnn) # Calculate Target Qvalues for comparision and evaluating our model.
-        inputs, targets = Variable(inputs), Variable(targets)
-        predictions, hidden = cnn(inputs, None)
-        loss_error = loss(predictions, targets) #Calculating loss
-        optimizer.zero_grad() #Setting gradients to zero
-        loss_error.backward() #Doing back propagation
-        optimizer.step() #Updating weights
-
-    #Evaluating our model on games played in this epoch
-    rewards_steps = n_steps.rewards_steps()
-    ma.add(rewards_steps) 
-    avg_reward = ma.average() #Calculating average of rewards
-    print("Epoch: %s, Average Reward: %s" % (str(epoch), str(avg_reward))) #Output for each epoch
-    save() #Saving current model
-    #Note: these rewards are not the scores displayed at the end of games. They are the number of steps taken*2 and still the agent is alive
-    if avg_reward >= 20: #Checking for some milestones
-        print("20 reached")
-        save()
-    if avg_reward >= 50: #Checking for some milestones
-        print("50 reached")
-        save()                
-    if avg_reward >= 100: #This score is really great
-        print("Congratulations!")
-        save()                
-        break
\ No newline at end of file
+    return 1
+
+if __name__ == "__main__":
+    #Use "python ai.py --resume" if you have a checkpoint to use
+    train(resume = '--resume' in sys.argv)
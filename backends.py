@@ -0,0 +1,369 @@
+# Display capture and input injection backends used by env, start_game and action.
+# 'pyautogui' drives the real desktop, 'xvfb' starts a virtual framebuffer and drives it with pyautogui,
+# 'stub' keeps everything in memory and simulates the game menus, so the code can run without a desktop,
+# 'obstacles' adds a simple game to the stub whose runs depend on the actions (see ObstacleBackend).
+# The backend is chosen with the backend argument or the SUBWAY_BACKEND environment variable.
+
+import atexit
+import os
+import select
+import shutil
+import subprocess
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+import numpy as np
+
+Box = namedtuple('Box', ['left', 'top', 'width', 'height'])
+Match = namedtuple('Match', ['score', 'box', 'scale']) #Best template match, box is None if nothing fits
+
+class BackendError(RuntimeError):
+    pass
+
+# Interface shared by every backend. Screen locations are returned as Box tuples.
+class Backend:
+    cache_calibration = True #Whether start_game may cache the game region found on this screen
+
+    def screenshot(self, region = None):
+        raise NotImplementedError
+
+    # Best match of the image on the screen (or in the region), see matcher.TemplateMatcher.
+    # The screen is captured and searched once, callers compare the score with their confidence level.
+    # screen: a full screen capture to search instead of taking a new one.
+    def match(self, image_path, region = None, screen = None):
+        from matcher import get_matcher #cv2 is only loaded when the screen is searched
+        offset = (region[0], region[1]) if region is not None else (0, 0)
+        if screen is None:
+            screen = self.screenshot(region)
+        elif region is not None:
+            screen = np.asarray(screen)[region[1]:region[1] + region[3], region[0]:region[0] + region[2]]
+        return get_matcher(image_path).match(screen, offset = offset)
+
+    # Returns the box of the image on the screen, or None if it is not found.
+    # Matching is always done in grayscale, the grayscale argument is kept for compatibility.
+    def locate(self, image_path, confidence = 0.8, grayscale = True, region = None):
+        result = self.match(image_path, region)
+        return result.box if result.box is not None and result.score >= confidence else None
+
+    def click(self, x, y):
+        raise NotImplementedError
+
+    def press(self, key):
+        raise NotImplementedError
+
+    # Returns the (width, height) of the screen.
+    def size(self):
+        raise NotImplementedError
+
+    def set_pause(self, seconds):
+        pass
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def center(self, box):
+        left, top, width, height = box
+        return (int(left + width / 2), int(top + height / 2))
+
+# Real desktop, through pyautogui.
+# pyautogui connects to the display when it is imported, so it is only imported on first use,
+# in a thread with a timeout so that a missing display fails fast instead of hanging.
+# A failed start is remembered and raised again on every later use, without waiting for the timeout again.
+class PyAutoGUIBackend(Backend):
+
+    def __init__(self, timeout = 10.0, pause = 0.01):
+        self.timeout = timeout #Startup timeout in seconds
+        self.pause = pause
+        self._gui = None
+        self._error = None #BackendError raised by the first start
+
+    @property
+    def gui(self):
+        if self._error is not None:
+            raise self._error
+        if self._gui is None:
+            try:
+                self._gui = self._load()
+            except BackendError as e:
+                self._error = e
+                raise
+        return self._gui
+
+    def _load(self):
+        result = {}
+        def target():
+            try:
+                import pyautogui
+                result['module'] = pyautogui
+            except BaseException as e:
+                result['error'] = e
+        thread = threading.Thread(target = target, daemon = True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise BackendError("pyautogui did not start within %.1f seconds" % self.timeout)
+        if 'error' in result:
+            raise BackendError("Could not start pyautogui: %s" % result['error'])
+        gui = result['module']
+        gui.PAUSE = self.pause
+        gui.FAILSAFE = False
+        return gui
+
+    def screenshot(self, region = None):
+        return self.gui.screenshot(region = tuple(region) if region is not None else None)
+
+    def click(self, x, y):
+        self.gui.click(x = int(x), y = int(y), clicks = 1, button = 'left')
+
+    def press(self, key):
+        self.gui.press(key)
+
+    def size(self):
+        width, height = self.gui.size()
+        return (int(width), int(height))
+
+    def set_pause(self, seconds):
+        self.pause = seconds
+        if self._gui is not None:
+            self._gui.PAUSE = seconds
+
+# Virtual framebuffer (Xvfb) for headless Linux servers.
+# The X server is started on first use and the backend waits until it reports its display before loading pyautogui.
+# By default Xvfb picks a free display itself (-displayfd), so parallel actors each get their own one.
+class XvfbBackend(PyAutoGUIBackend):
+
+    def __init__(self, display = None, width = 1280, height = 800, timeout = 10.0, pause = 0.01):
+        super(XvfbBackend, self).__init__(timeout = timeout, pause = pause)
+        self.display = display #Display number, None to use the first free one
+        self.width = width
+        self.height = height
+        self.process = None
+
+    def _load(self):
+        self.start()
+        return super(XvfbBackend, self)._load()
+
+    def start(self):
+        if self.process is not None:
+            return
+        if shutil.which('Xvfb') is None:
+            raise BackendError("Xvfb is not installed")
+        # Xvfb writes the display number to this pipe once it accepts connections
+        read_fd, write_fd = os.pipe()
+        display = [':%d' % self.display] if self.display is not None else []
+        try:
+            self.process = subprocess.Popen(['Xvfb'] + display + ['-displayfd', str(write_fd),
+                                            '-screen', '0', '%dx%dx24' % (self.width, self.height)],
+                                            stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, pass_fds = (write_fd,))
+        finally:
+            os.close(write_fd)
+        atexit.register(self.stop)
+        try:
+            number = self._read_display(read_fd)
+        except BaseException:
+            self.stop()
+            raise
+        finally:
+            os.close(read_fd)
+        if self.process.poll() is not None: #e.g. the display was already in use
+            code = self.process.returncode
+            self.stop()
+            raise BackendError("Xvfb exited with code %s" % code)
+        self.display = number
+        os.environ['DISPLAY'] = ':%d' % self.display
+
+    # Display number written by Xvfb on the pipe, within the startup timeout.
+    def _read_display(self, fd):
+        data = b''
+        deadline = time.monotonic() + self.timeout
+        while not data.endswith(b'\n'):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise BackendError("Xvfb did not start within %.1f seconds" % self.timeout)
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 64)
+            if not chunk: #Pipe closed without a display number: Xvfb exited
+                self.process.wait()
+                raise BackendError("Xvfb exited with code %s" % self.process.returncode)
+            data += chunk
+        return int(data.strip())
+
+    def stop(self):
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+            self.process.wait()
+            self.process = None
+            atexit.unregister(self.stop)
+
+# In-memory backend simulating the game menus, for tests and parallel actors without a desktop.
+# The title screen shows start_t.png, clicking it shows play.png, clicking play starts a run
+# that ends (play.png visible again) after a random number of captured frames.
+# Screenshots are random noise, or taken in turn from the given frames.
+class StubBackend(Backend):
+    cache_calibration = False #Simulated screens must not replace the calibration of the real one
+
+    def __init__(self, width = 400, height = 600, frames = None, episode_length = (10, 50), seed = None):
+        self.width = width
+        self.height = height
+        self.frames = frames #Optional list of images (numpy arrays) returned by screenshot
+        self.episode_length = episode_length #Range of the number of frames before game over
+        self.random = np.random.RandomState(seed)
+        self.start_box = Box(width // 4, height // 8, width // 2, height // 8)
+        self.play_box = Box(width // 4, height * 3 // 4, width // 2, height // 8)
+        self.state = 'title'
+        self.steps_left = 0
+        self.frame_index = 0
+        self.clicks = [] #History of the clicks and key presses
+        self.presses = []
+
+    def screenshot(self, region = None):
+        left, top, width, height = region if region is not None else (0, 0, self.width, self.height)
+        if self.state == 'playing':
+            self.steps_left -= 1
+            if self.steps_left <= 0:
+                self.state = 'menu' #Game over, play button visible
+        if self.frames:
+            frame = np.asarray(self.frames[self.frame_index % len(self.frames)])
+            self.frame_index += 1
+            return frame[top:top + height, left:left + width]
+        return self.random.randint(0, 256, (height, width, 3), dtype = np.uint8)
+
+    # Buttons are matched by file name: a perfect match when the button is on the screen, else no match.
+    def match(self, image_path, region = None, screen = None):
+        name = Path(image_path).stem
+        box = None
+        if name.startswith('start') and self.state == 'title':
+            box = self.start_box
+        elif name.startswith('play') and self.state == 'menu':
+            box = self.play_box
+        if box is None or (region is not None and not self._inside(box, region)):
+            return Match(0.0, None, None)
+        return Match(1.0, box, 1.0)
+
+    def click(self, x, y):
+        self.clicks.append((x, y))
+        if self.state == 'title' and self._hit(self.start_box, x, y):
+            self.state = 'menu'
+        elif self.state == 'menu' and self._hit(self.play_box, x, y):
+            self.state = 'playing'
+            self.steps_left = self.random.randint(self.episode_length[0], self.episode_length[1] + 1)
+
+    def press(self, key):
+        self.presses.append(key)
+
+    def size(self):
+        return (self.width, self.height)
+
+    def sleep(self, seconds):
+        pass #No real game to wait for
+
+    def _hit(self, box, x, y):
+        left, top, width, height = box
+        return left <= x < left + width and top <= y < top + height
+
+    def _inside(self, box, region):
+        return (box[0] >= region[0] and box[1] >= region[1]
+                and box[0] + box[2] <= region[0] + region[2] and box[1] + box[3] <= region[1] + region[3])
+
+# Simulated game whose outcome depends on the actions, so policies and hyperparameters can be compared without a desktop
+# (the runs of StubBackend end after a random number of frames whatever the agent does).
+# The game region shows three lanes seen from above, obstacles come down one row per captured frame and the run
+# ends when one reaches the player's row in the player's lane, unless it is dodged: low barriers are jumped over
+# (up), high barriers are rolled under (down) and trains can only be avoided by changing lane (left, right).
+# A random policy survives about 16 frames with the default density, one that dodges every obstacle reaches max_length.
+class ObstacleBackend(StubBackend):
+    LANES = 3
+    KINDS = ('low', 'high', 'train')
+    DODGE = {'low': 'up', 'high': 'down'} #Move clearing each kind of obstacle, trains have none
+    SHADES = {'low': 140, 'high': 200, 'train': 255, 'player': 80, 'dodging': 40} #Gray levels, told apart after preprocessing
+
+    # rows: rows of the lanes, an obstacle takes rows - 1 frames to reach the player.
+    # density: probability that an obstacle appears on each frame. dodge_frames: duration of a jump or roll in frames.
+    # max_length: frames after which the run ends anyway, so that the episodes of a good policy are counted.
+    def __init__(self, width = 400, height = 600, rows = 8, density = 0.5, dodge_frames = 2, max_length = 500, seed = None):
+        super(ObstacleBackend, self).__init__(width = width, height = height, seed = seed)
+        self.rows = rows
+        self.density = density
+        self.dodge_frames = dodge_frames
+        self.max_length = max_length
+        # Game region found by start_game.begin: from the start button down to the bottom of the play button
+        self.region = Box(self.start_box.left, self.start_box.top, self.start_box.width,
+                          self.play_box.top + self.play_box.height - self.start_box.top)
+        self._new_run()
+
+    def _new_run(self):
+        self.lane = self.LANES // 2
+        self.obstacles = [] #[row, lane, kind], row 0 is the top of the region
+        self.dodge = None #'up' or 'down' while jumping or rolling
+        self.dodge_left = 0
+        self.length = 0
+
+    def screenshot(self, region = None):
+        if self.state == 'playing':
+            self._advance()
+        left, top, width, height = region if region is not None else (0, 0, self.width, self.height)
+        return self._render()[top:top + height, left:left + width]
+
+    def click(self, x, y):
+        playing = self.state == 'playing'
+        super(ObstacleBackend, self).click(x, y)
+        if self.state == 'playing' and not playing:
+            self._new_run()
+
+    def press(self, key):
+        super(ObstacleBackend, self).press(key)
+        if self.state != 'playing':
+            return
+        if key == 'left':
+            self.lane = max(self.lane - 1, 0)
+        elif key == 'right':
+            self.lane = min(self.lane + 1, self.LANES - 1)
+        elif key in ('up', 'down'):
+            self.dodge = key
+            self.dodge_left = self.dodge_frames
+
+    # One frame of the game: the obstacles move down a row, then the player's row is checked.
+    def _advance(self):
+        self.length += 1
+        if self.dodge_left > 0:
+            self.dodge_left -= 1
+        else:
+            self.dodge = None
+        for obstacle in self.obstacles:
+            obstacle[0] += 1
+        self.obstacles = [obstacle for obstacle in self.obstacles if obstacle[0] < self.rows]
+        hit = any(row == self.rows - 1 and lane == self.lane and self.dodge != self.DODGE.get(kind)
+                  for row, lane, kind in self.obstacles)
+        if hit or self.length >= self.max_length:
+            self.state = 'menu' #Game over, play button visible
+            return
+        if self.random.rand() < self.density:
+            self.obstacles.append([0, self.random.randint(self.LANES), self.KINDS[self.random.randint(len(self.KINDS))]])
+
+    def _render(self):
+        screen = np.zeros((self.height, self.width, 3), dtype = np.uint8)
+        left, top, width, height = self.region
+        lane_width, row_height = width // self.LANES, height // self.rows
+        def fill(row, lane, shade, margin):
+            x, y = left + lane * lane_width, top + row * row_height
+            screen[y + margin:y + row_height - margin, x + margin:x + lane_width - margin] = shade
+        for row, lane, kind in self.obstacles:
+            fill(row, lane, self.SHADES[kind], 2)
+        fill(self.rows - 1, self.lane, self.SHADES['dodging' if self.dodge else 'player'], row_height // 4)
+        return screen
+
+BACKENDS = {'pyautogui': PyAutoGUIBackend, 'xvfb': XvfbBackend, 'stub': StubBackend, 'obstacles': ObstacleBackend}
+
+# Returns a backend instance: the given instance, or a new backend from its name
+# (default: SUBWAY_BACKEND environment variable, else 'pyautogui').
+def get_backend(backend = None, **kwargs):
+    if isinstance(backend, Backend):
+        return backend
+    name = backend or os.environ.get('SUBWAY_BACKEND', 'pyautogui')
+    if name not in BACKENDS:
+        raise BackendError("Unknown backend: %s (choose from %s)" % (name, ', '.join(BACKENDS)))
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,49 @@
+# Benchmark of the cold start (import) time of the acting and training entry points.
+# Each measurement runs in a fresh python process. The "eager" rows also import the
+# libraries that used to be loaded at module level (matplotlib, pandas, skimage, cv2, pynput),
+# which gives the startup cost before they were made lazy.
+# Usage: python bench_imports.py [repeats]
+
+import os
+import subprocess
+import sys
+import numpy as np
+
+ENTRY_POINTS = {
+    'acting': ['env', 'neural_net', 'n_step', 'preprocess_image'],
+    'training': ['ai'], #What python ai.py imports before training starts (env, replay memory, checkpoints...)
+}
+
+EAGER_IMPORTS = ['matplotlib.pyplot', 'pandas', 'skimage.transform', 'cv2', 'pynput.keyboard']
+
+# Time taken by a fresh interpreter to import the given modules, in seconds (None if an import failed).
+def import_time(modules):
+    code = ("import time\n"
+            "start = time.perf_counter()\n"
+            + "".join("import %s\n" % module for module in modules) +
+            "print(time.perf_counter() - start)\n")
+    result = subprocess.run([sys.executable, '-c', code], cwd = os.path.dirname(os.path.abspath(__file__)),
+                            capture_output = True, text = True)
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1])
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+def benchmark(repeats = 5):
+    print("%-10s %-6s %10s %10s" % ('entry', 'mode', 'median(s)', 'min(s)'))
+    for name, modules in ENTRY_POINTS.items():
+        medians = {}
+        for mode, extra in (('eager', EAGER_IMPORTS), ('lazy', [])):
+            times = [import_time(extra + modules) for _ in range(repeats)]
+            times = [t for t in times if t is not None]
+            if not times:
+                print("%-10s %-6s %10s %10s" % (name, mode, 'failed', 'failed'))
+                continue
+            medians[mode] = np.median(times)
+            print("%-10s %-6s %10.3f %10.3f" % (name, mode, medians[mode], min(times)))
+        if len(medians) == 2:
+            print("%-10s saved %.3fs (%.0f%%)" % (name, medians['eager'] - medians['lazy'],
+                                                 100 * (1 - medians['lazy'] / medians['eager'])))
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
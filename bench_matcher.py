@@ -0,0 +1,92 @@
+# Benchmark of the start/play button detection on test_screenshot.png and the images folder.
+# "old" repeats a pyscreeze search (what pyautogui.locateOnScreen uses) for every confidence level,
+# loading the template from disk each time, like the previous start_game/env code.
+# "new" is one TemplateMatcher.match with the template pyramid loaded once.
+# The play button template is also checked on every screen without it: its score must stay under the
+# confidence level of start_game/env, else the script exits with an error.
+# Usage: python bench_matcher.py [repeats]
+
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import cv2
+from matcher import TemplateMatcher
+from start_game import PLAY_CONFIDENCE
+
+BASE = Path(__file__).parent
+TEMPLATES = {'play.png': [0.8, 0.7, 0.6, 0.5, 0.4], 'start_t.png': [0.8, 0.7, 0.6, 0.5]} #Last level: the one accepted
+
+def screens():
+    paths = [BASE / 'test_screenshot.png'] + sorted(p for p in (BASE / 'images').iterdir() if p.suffix in ('.png', '.jpg'))
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is not None:
+            yield path.name, cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def old_locate(template_path, screen, confidences):
+    import pyscreeze
+    from PIL import Image
+    haystack = Image.fromarray(screen)
+    for confidence in confidences:
+        try:
+            box = pyscreeze.locate(str(template_path), haystack, grayscale = True, confidence = confidence)
+        except (pyscreeze.ImageNotFoundException, ValueError): #ValueError: template larger than the screen
+            box = None
+        if box:
+            return confidence
+    return None
+
+def timed(function, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, 1000 * np.median(times)
+
+def benchmark(repeats = 3):
+    try:
+        import pyscreeze
+        has_old = True
+    except ImportError:
+        print("pyscreeze not installed, only timing the new matcher")
+        has_old = False
+    start = time.perf_counter()
+    matchers = {name: TemplateMatcher(BASE / 'images' / name) for name in TEMPLATES}
+    print("Templates and pyramids loaded in %.1f ms" % (1000 * (time.perf_counter() - start)))
+    print("%-36s %-12s %10s %10s %8s %10s %6s %6s" % ('screen', 'template', 'old(ms)', 'new(ms)', 'score', 'old conf', 'old', 'new'))
+    totals = [0.0, 0.0]
+    for screen_name, screen in screens():
+        for name, confidences in TEMPLATES.items():
+            match, new_ms = timed(lambda: matchers[name].match(screen), repeats)
+            old_conf, old_ms = (timed(lambda: old_locate(BASE / 'images' / name, screen, confidences), repeats)
+                                if has_old else (None, float('nan')))
+            totals[0] += old_ms
+            totals[1] += new_ms
+            # Detection decisions: found at any confidence level for the old search, score over the last level for the new one
+            old_found = ('yes' if old_conf is not None else 'no') if has_old else '-'
+            new_found = 'yes' if match.box is not None and match.score >= confidences[-1] else 'no'
+            print("%-36s %-12s %10.1f %10.1f %8.2f %10s %6s %6s"
+                  % (screen_name[:36], name, old_ms, new_ms, match.score, old_conf, old_found, new_found))
+    print("Total: old %.1f ms, new %.1f ms" % tuple(totals))
+
+# Screens of the repository that do not show the play button must not be detected as game over.
+# Returns the names of the screens detected anyway.
+def check_false_positives():
+    matcher = TemplateMatcher(BASE / 'images' / 'play.png')
+    failures = []
+    for screen_name, screen in screens():
+        if screen_name == 'play.png':
+            continue
+        match = matcher.match(screen)
+        if match.box is not None and match.score >= PLAY_CONFIDENCE:
+            failures.append(screen_name)
+            print("False play button on %s: score %.2f >= %.2f" % (screen_name, match.score, PLAY_CONFIDENCE))
+    return failures
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
+    if check_false_positives():
+        sys.exit(1)
+    print("No false play button on the screens without one")
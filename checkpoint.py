@@ -0,0 +1,169 @@
+# Checkpoint manager used to save and restore the training state without blocking training.
+# Checkpoints are serialized in a background thread and written atomically (temp file + rename),
+# the last few are kept on disk along with the best one according to the moving average.
+# The replay memory is large, so it is stored in its own file and only written when asked (see save_replay).
+
+import copy
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import torch
+
+# Read a checkpoint file on the CPU.
+def load_checkpoint(path):
+    try:
+        return torch.load(path, map_location = 'cpu', weights_only = False) #Replay state contains numpy arrays
+    except TypeError: #Older versions of torch have no weights_only argument
+        return torch.load(path, map_location = 'cpu')
+
+class CheckpointManager:
+
+    # resume: continue an earlier run in this folder, restoring its best score.
+    # A new run starts without a best score, so its first checkpoint replaces the best one of the earlier run.
+    def __init__(self, directory = 'checkpoints', keep_last = 3, prefix = 'brain', resume = False):
+        self.directory = directory #Folder where the checkpoints are stored
+        self.keep_last = keep_last #Number of recent checkpoints kept on disk
+        self.prefix = prefix
+        self.best_path = os.path.join(directory, '%s_best.pth' % prefix)
+        self.best_info_path = os.path.join(directory, '%s_best.json' % prefix)
+        self.replay_path = os.path.join(directory, '%s_replay.pth' % prefix)
+        self.best_score = None
+        self.error = None #Last exception raised by the writer thread
+        os.makedirs(directory, exist_ok = True)
+        if resume and os.path.isfile(self.best_info_path):
+            with open(self.best_info_path) as f:
+                self.best_score = json.load(f).get('score')
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target = self._worker, daemon = True)
+        self.thread.start()
+
+    # Path of the checkpoint for a given epoch.
+    def path(self, epoch):
+        return os.path.join(self.directory, '%s_%06d.pth' % (self.prefix, epoch))
+
+    # List of the epoch checkpoints on disk, oldest written first.
+    # Sorted by modification time rather than by epoch, so a new run starting again at epoch 1
+    # is not taken for older than the checkpoints left by an earlier run.
+    def checkpoints(self):
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.startswith(self.prefix + '_') and name.endswith('.pth')
+                 and name[len(self.prefix) + 1:-4].isdigit()]
+        return sorted(paths, key = lambda path: (os.stat(path).st_mtime_ns, path))
+
+    # Most recent epoch checkpoint, or None.
+    def latest(self):
+        paths = self.checkpoints()
+        return paths[-1] if paths else None
+
+    # Snapshot the training state and queue it for writing.
+    # The snapshot is taken here so that training can keep updating the weights while the file is written.
+    # memory: also queue a copy of the replay memory (see save_replay), None to leave the replay file as it is.
+    def save(self, epoch, cnn, optimizer = None, score = None, memory = None, ma = None):
+        checkpoint = {'epoch': epoch,
+                      'score': score,
+                      'state_dict': {k: v.detach().cpu().clone() for k, v in cnn.state_dict().items()}}
+        if optimizer is not None:
+            checkpoint['optimizer'] = copy.deepcopy(optimizer.state_dict())
+        if ma is not None:
+            checkpoint['ma'] = ma.state_dict()
+        is_best = score is not None and score == score and (self.best_score is None or score > self.best_score)
+        if is_best:
+            self.best_score = score
+        self.queue.put(('checkpoint', (checkpoint, is_best)))
+        if memory is not None:
+            self.save_replay(memory)
+
+    # Queue a copy of the replay memory for writing. Only the lists of steps are copied here,
+    # the float16 conversion and the serialization are done by the writer thread.
+    def save_replay(self, memory):
+        self.queue.put(('replay', (memory.snapshot(), memory.compact)))
+
+    # Load a checkpoint (latest one by default) and restore whatever it contains.
+    # Returns the checkpoint dictionary, or None if there is nothing to load.
+    def load(self, cnn, optimizer = None, memory = None, ma = None, path = None):
+        path = path or self.latest()
+        if path is None or not os.path.isfile(path):
+            return None
+        checkpoint = load_checkpoint(path)
+        cnn.load_state_dict(checkpoint['state_dict'])
+        if optimizer is not None and 'optimizer' in checkpoint:
+            optimizer.load_state_dict(checkpoint['optimizer'])
+        if memory is not None:
+            if os.path.isfile(self.replay_path):
+                memory.load_state_dict(load_checkpoint(self.replay_path))
+            elif 'memory' in checkpoint: #Checkpoints storing the replay memory with the weights
+                memory.load_state_dict(checkpoint['memory'])
+        if ma is not None and 'ma' in checkpoint:
+            ma.load_state_dict(checkpoint['ma'])
+        return checkpoint
+
+    # Wait until every queued checkpoint has been written.
+    def flush(self):
+        self.queue.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    # Flush and stop the writer thread.
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    # Writer thread: serializes the queued snapshots one after the other.
+    # The best checkpoint is a copy of the epoch file, the replay memory is converted here before being written.
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                kind, data = item
+                if kind == 'replay':
+                    snapshot, compact = data
+                    self._write(compact(snapshot), self.replay_path)
+                    continue
+                checkpoint, is_best = data
+                path = self.path(checkpoint['epoch'])
+                self._write(checkpoint, path)
+                if is_best:
+                    shutil.copyfile(path, self.best_path + '.tmp') #Same content, no need to serialize it again
+                    os.replace(self.best_path + '.tmp', self.best_path)
+                    self._write_json({'epoch': checkpoint['epoch'], 'score': checkpoint['score']}, self.best_info_path)
+                self._prune()
+            except Exception as e:
+                print("Error saving checkpoint: %s" % e)
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    # Write to a temporary file in the same folder and rename it, so a crash never leaves a half written checkpoint.
+    def _write(self, obj, path):
+        fd, tmp = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                torch.save(obj, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _write_json(self, obj, path):
+        fd, tmp = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)
+
+    # Remove the oldest epoch checkpoints, the best one is stored in its own file.
+    def _prune(self):
+        paths = self.checkpoints()
+        for path in paths[:max(len(paths) - self.keep_last, 0)]:
+            os.remove(path)
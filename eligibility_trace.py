@@ -6,10 +6,9 @@ import torch.optim as optim
 from torch.autograd import Variable
 #trace
 # Implementing Eligibility Trace
-def eligibility_trace(batch, cnn):
+def eligibility_trace(batch, cnn, gamma = 0.99): #Gamma to reduce effect of older rewards
     targets = [] #Target for evaluation of our model
     inputs = []
-    gamma = 0.99 #Gamma to reduce effect of older rewards
     for series in batch:
         input = Variable(torch.from_numpy(np.array([series[0].state, series[-1].state], dtype = np.float32))) #Extracting input
         output, hidden = cnn(input) #Forward propagation
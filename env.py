@@ -2,9 +2,7 @@
 
 # Importing the libraries
 import numpy as np
-import pyautogui
 import time
-from pynput import keyboard
 import random
 import os
 from pathlib import Path
@@ -13,29 +11,67 @@ from pathlib import Path
 from action import action
 from start_game import begin
 from preprocess_image import preprocess_image
+from backends import BackendError, get_backend
+from frame_diff import FrameDiff
 
 class env:
-    def __init__(self):
+    # backend: display/input backend name or instance (see backends.get_backend), e.g. 'stub' on a headless server.
+    def __init__(self, backend=None):
         self.action_space = 5
+        self.backend = get_backend(backend)
         # Get the base directory and images folder
         self.base_dir = Path(__file__).parent
         self.images_dir = self.base_dir / "images"
         
         # Initialize game location
-        self.loc = begin()
-        pyautogui.click(
-            x=int(self.loc["left"] + self.loc["width"] / 2),
-            y=int(self.loc["top"] + self.loc["height"] / 2),
-            clicks=1,
-            button='left'
+        self.loc = begin(self.backend)
+        self.backend.click(
+            int(self.loc["left"] + self.loc["width"] / 2),
+            int(self.loc["top"] + self.loc["height"] / 2)
         )
         self.act = action(
             int(self.loc["left"]), 
             int(self.loc["top"]), 
             int(self.loc["width"]), 
-            int(self.loc["height"])
+            int(self.loc["height"]),
+            backend=self.backend
         )     
         
+        # Change detection: while the game region does not change, the last detection and preprocessing are reused
+        self.frame_diff = FrameDiff()
+        self.skipped = {'detection': 0, 'preprocess': 0}  # Work avoided on static frames
+        self._match = None
+        self._state = None
+        
+    # One capture of the screen, and the game region cropped from it.
+    def capture(self):
+        screen = np.asarray(self.backend.screenshot())
+        top, left = int(self.loc["top"]), int(self.loc["left"])
+        frame = screen[top:top + int(self.loc["height"]), left:left + int(self.loc["width"])]
+        return screen, frame
+    
+    # Match of the play button, reused if the game region did not change since the last search.
+    def play_match(self, screen, static):
+        if static and self._match is not None:
+            self.skipped['detection'] += 1
+            return self._match
+        self._match = self.backend.match(str(self.images_dir / "play.png"), screen=screen)
+        return self._match
+    
+    # Preprocessed game region, reused if it did not change since the last one.
+    def preprocess(self, frame, static):
+        if static and self._state is not None:
+            self.skipped['preprocess'] += 1
+            return self._state
+        self._state = preprocess_image(frame)
+        return self._state
+    
+    # Forget the cached results, after a click that changes the screen.
+    def invalidate(self):
+        self.frame_diff.reset()
+        self._match = None
+        self._state = None
+        
     # To take random action.
     def action_space_sample(self):
         return random.randint(0,4)
@@ -57,45 +93,42 @@ class env:
         
         while attempts < max_attempts:
             try:
-                # Look for play button with different confidence levels
+                # Look for play button once, accepting scores down to 0.4
+                # The search is skipped while the screen stays the same as in the previous attempt
                 play_location = None
-                for confidence in [0.8, 0.7, 0.6, 0.5, 0.4]:
-                    try:
-                        play_location = pyautogui.locateOnScreen(
-                            str(play_img_path), 
-                            confidence=confidence,
-                            grayscale=True
-                        )
-                        if play_location:
-                            print(f"Found play button with confidence {confidence}")
-                            break
-                    except pyautogui.ImageNotFoundException:
-                        continue
+                screen, frame = self.capture()
+                match = self.play_match(screen, self.frame_diff.is_static(frame))
+                if match.box is not None and match.score >= 0.4:
+                    play_location = match.box
+                    print(f"Found play button with score {match.score:.2f}")
                 
                 if play_location:
                     # Click on the play button
-                    x, y = pyautogui.center(play_location)
+                    x, y = self.backend.center(play_location)
                     print(f"Clicking play button at ({x}, {y})")
-                    pyautogui.click(x, y)
+                    self.backend.click(x, y)
+                    self.invalidate()
                     
                     # CRITICAL FIX: Wait longer for game to fully load
                     print("Waiting for game to start...")
-                    time.sleep(3.0)  # Increased from 2.5 to 3.0 seconds
+                    self.backend.sleep(3.0)  # Increased from 2.5 to 3.0 seconds
                     
                     # CRITICAL FIX: Clear any pending mouse/keyboard actions
-                    pyautogui.PAUSE = 0.1  # Small pause between actions
+                    self.backend.set_pause(0.1)  # Small pause between actions
                     
                     print("Game should be ready now")
                     break
                 else:
                     if attempts == 0:  # Only print this once to reduce spam
                         print(f"Play button not found, attempt {attempts + 1}")
-                    time.sleep(0.1)
+                    self.backend.sleep(0.1)
                     attempts += 1
                     
+            except BackendError:
+                raise  # No display or input: retrying will not help
             except Exception as e:
                 print(f"Error looking for play button: {e}")
-                time.sleep(0.1)
+                self.backend.sleep(0.1)
                 attempts += 1
         
         if attempts >= max_attempts:
@@ -106,16 +139,14 @@ class env:
         print("Capturing initial game state...")
         try:
             # Wait a bit more to ensure game is stable
-            time.sleep(0.5)
+            self.backend.sleep(0.5)
             
-            state = preprocess_image(pyautogui.screenshot(region=(
-                int(self.loc["left"]), 
-                int(self.loc["top"]), 
-                int(self.loc["width"]), 
-                int(self.loc["height"])
-            )))
+            screen, frame = self.capture()
+            state = self.preprocess(frame, self.frame_diff.is_static(frame))
             print("Initial state captured successfully")
             return state
+        except BackendError:
+            raise
         except Exception as e:
             print(f"Error taking screenshot: {e}")
             return None
@@ -126,42 +157,35 @@ class env:
     # if game over, reward = -5 else reward = 1.
     def step(self, action):
         # CRITICAL FIX: Add small delay before performing action
-        time.sleep(0.1)  # Let game stabilize before acting
+        self.backend.sleep(0.1)  # Let game stabilize before acting
         
         print(f"performing action")
         self.act.perform(action)
         
         # CRITICAL FIX: Wait for action to complete before checking game state
-        time.sleep(0.2)  # Wait for action to take effect
+        self.backend.sleep(0.2)  # Wait for action to take effect
         
         Done = True
-        
-        play_img_path = self.images_dir / "play.png"
+        static = False
         
         try:
+            # One capture for both the game over check and the next state
+            screen, frame = self.capture()
+            static = self.frame_diff.is_static(frame)
             # Check if game is still running (no play button visible)
-            play_location = pyautogui.locateOnScreen(
-                str(play_img_path), 
-                confidence=0.4,
-                grayscale=True
-            )
-            Done = play_location is not None
-        except pyautogui.ImageNotFoundException:
-            Done = False
+            match = self.play_match(screen, static)
+            Done = match.box is not None and match.score >= 0.4
+        except BackendError:
+            raise
         except Exception as e:
             print(f"Error checking game state: {e}")
             Done = True  # Assume game over if we can't check
         
-        # CRITICAL FIX: Only take screenshot if game is still running
+        # CRITICAL FIX: Only preprocess the screenshot if game is still running
         next_state = None
         if not Done:
             try:
-                next_state = preprocess_image(pyautogui.screenshot(region=(
-                    int(self.loc["left"]), 
-                    int(self.loc["top"]), 
-                    int(self.loc["width"]), 
-                    int(self.loc["height"])
-                )))
+                next_state = self.preprocess(frame, static)
             except Exception as e:
                 print(f"Error taking screenshot in step: {e}")
                 next_state = None
@@ -172,4 +196,4 @@ class env:
             print("Game Over detected")
             print("\nGame Ended\n")  # Add separator for clarity
             
-        return (next_state, reward, Done, {})
\ No newline at end of file
+        return (next_state, reward, Done, {'static': static})
\ No newline at end of file
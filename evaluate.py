@@ -0,0 +1,154 @@
+# Evaluation of a trained AI, separate from training: loads a checkpoint and plays episodes with a greedy
+# (or low temperature) policy in parallel worker processes, on a simulated game or replayed screenshots.
+# Only the 'obstacles' game (backends.ObstacleBackend) ends runs according to the actions: on 'stub' and 'replay'
+# games end after a random number of frames, so only the speed of the rollouts is reported for them.
+# Usage: python evaluate.py [--checkpoint PATH] [--episodes 20] [--workers 4] [--policy greedy|boltzmann] [--T 100]
+#                           [--env obstacles|stub|replay] [--frames DIR] [--max-steps 1000] [--seed 0]
+
+import argparse
+import contextlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Checkpoint used by default: the best one, else the latest one.
+def default_checkpoint(directory = 'checkpoints'):
+    best = Path(directory) / 'brain_best.pth'
+    if best.is_file():
+        return str(best)
+    paths = sorted(Path(directory).glob('brain_[0-9]*.pth'), key = lambda path: path.stat().st_mtime_ns)
+    return str(paths[-1]) if paths else None
+
+# Screenshots replayed by the stub backend, all resized to the size of the first one.
+def load_frames(directory):
+    import cv2
+    frames = []
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix.lower() not in ('.png', '.jpg', '.jpeg'):
+            continue
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        if frames and image.shape != frames[0].shape:
+            image = cv2.resize(image, (frames[0].shape[1], frames[0].shape[0]))
+        frames.append(image)
+    if not frames:
+        raise ValueError("No images found in %s" % directory)
+    return frames
+
+# Play the given episodes in one worker process and return the length, reward and duration of each one.
+# Every episode gets its own backend seeded with seed + episode index, so the games played (and the statistics)
+# do not depend on the number of workers or on how the episodes are spread over them.
+def run_episodes(state_dict, indices, options, seed):
+    import numpy as np
+    import torch
+    from torch.autograd import Variable
+    import neural_net
+    from backends import ObstacleBackend, StubBackend
+    from env import env
+    from runtime import RuntimeConfig
+    RuntimeConfig.fixed(options['threads']).apply('acting')
+    frames = load_frames(options['frames']) if options['env'] == 'replay' else None
+    results = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull): #The env prints every step
+        cnn = None
+        for index in indices:
+            episode_seed = seed + index
+            torch.manual_seed(episode_seed)
+            np.random.seed(episode_seed)
+            if options['env'] == 'replay':
+                backend = StubBackend(width = frames[0].shape[1], height = frames[0].shape[0], frames = frames, seed = episode_seed)
+            elif options['env'] == 'obstacles':
+                backend = ObstacleBackend(seed = episode_seed)
+            else:
+                backend = StubBackend(seed = episode_seed)
+            senv = env(backend)
+            if cnn is None:
+                cnn = neural_net.CNN(senv.action_space)
+                cnn.load_state_dict(state_dict)
+                cnn.eval()
+                if options['policy'] == 'greedy':
+                    body = neural_net.ActionSelector(mode = 'greedy')
+                else:
+                    body = neural_net.ActionSelector(T = options['T'], mode = 'boltzmann')
+                ai = neural_net.AI(body = body, brain = cnn)
+            start = time.perf_counter()
+            state = senv.reset()
+            if state is None:
+                continue
+            hidden = (Variable(torch.zeros(1, 256)), Variable(torch.zeros(1, 256)))
+            length, reward, done = 0, 0.0, False
+            while not done and length < options['max_steps']:
+                action, hidden = ai(Variable(torch.from_numpy(np.array([state], dtype = np.float32))), hidden)
+                next_state, r, done, _ = senv.step(action)
+                reward += r
+                length += 1
+                if next_state is not None:
+                    state = next_state
+            results.append({'episode': index, 'length': length, 'reward': reward, 'time': time.perf_counter() - start})
+    return results
+
+# Spread the episodes over the workers, gather the per-episode results and print the statistics.
+def evaluate(checkpoint, episodes = 20, workers = None, options = None, seed = 0):
+    from checkpoint import load_checkpoint
+    from moving_avg import MA
+    options = dict({'policy': 'greedy', 'T': 100, 'env': 'obstacles', 'frames': None, 'max_steps': 1000, 'threads': 1},
+                   **(options or {}))
+    state_dict = load_checkpoint(checkpoint)['state_dict']
+    workers = max(min(workers or os.cpu_count() or 1, episodes), 1)
+    print("Evaluating %s: %d episodes on %d workers (%s policy, %s env)"
+          % (checkpoint, episodes, workers, options['policy'], options['env']))
+    start = time.perf_counter()
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers = workers, mp_context = context) as pool:
+        futures = [pool.submit(run_episodes, state_dict, list(range(i, episodes, workers)), options, seed)
+                   for i in range(workers)]
+        for future in futures:
+            results.extend(future.result())
+    results.sort(key = lambda result: result['episode']) #Same order whatever the number of workers
+    wall_clock = time.perf_counter() - start
+    if not results:
+        print("No episode could be played")
+        return None
+    steps = sum(result['length'] for result in results)
+    report = {'episodes': len(results),
+              'steps_per_second': steps / sum(result['time'] for result in results), #Per worker
+              'total_steps_per_second': steps / wall_clock} #All the workers together
+    if options['env'] == 'obstacles':
+        # Statistics over all the episodes, computed with the moving average window used in training
+        print("%-8s %10s %10s %10s %10s %10s" % ('', 'mean', 'min', 'p50', 'p90', 'max'))
+        for key in ('length', 'reward'):
+            ma = MA(len(results))
+            ma.add([result[key] for result in results])
+            stats = report[key] = ma.summary()
+            print("%-8s %10.2f %10.2f %10.2f %10.2f %10.2f" % (key, stats['average'], stats['min'], stats['p50'], stats['p90'], stats['max']))
+    else: #Lengths and rewards do not depend on the checkpoint
+        print("Note: games of the %s env end at random whatever the actions, only the speed is reported."
+              " Use --env obstacles to compare checkpoints." % options['env'])
+    print("Steps/s: %.1f per worker, %.1f total" % (report['steps_per_second'], report['total_steps_per_second']))
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Evaluate a checkpoint with greedy rollouts")
+    parser.add_argument('--checkpoint', default = None, help = "Checkpoint file (default: best, else latest in checkpoints/)")
+    parser.add_argument('--episodes', type = int, default = 20)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--policy', choices = ('greedy', 'boltzmann'), default = 'greedy')
+    parser.add_argument('--T', type = float, default = 100, help = "Softmax temperature of the boltzmann policy (higher is greedier)")
+    parser.add_argument('--env', choices = ('obstacles', 'stub', 'replay'), default = 'obstacles',
+                        help = "Simulated game (obstacles: runs depend on the actions, stub: random) or replayed screenshots")
+    parser.add_argument('--frames', default = 'images', help = "Folder of the screenshots replayed by --env replay")
+    parser.add_argument('--max-steps', type = int, default = 1000, help = "Longest episode")
+    parser.add_argument('--threads', type = int, default = 1, help = "torch threads per worker")
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+    checkpoint = args.checkpoint or default_checkpoint()
+    if checkpoint is None:
+        parser.error("no checkpoint found, give one with --checkpoint")
+    evaluate(checkpoint, episodes = args.episodes, workers = args.workers, seed = args.seed,
+             options = {'policy': args.policy, 'T': args.T, 'env': args.env, 'frames': args.frames,
+                        'max_steps': args.max_steps, 'threads': args.threads})
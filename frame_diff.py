@@ -0,0 +1,45 @@
+# Cheap change detection between consecutive captures of the game region.
+# A frame is reduced to a small grayscale thumbnail by sampling a grid of pixels, and compared with a reference:
+# the last frame found to differ, i.e. the frame the cached results were computed from.
+# Static frames (menus, loading, game over screen) can then reuse the previous preprocessing and detection results.
+
+import numpy as np
+
+class FrameDiff:
+
+    # size: (height, width) of the thumbnail. threshold: mean absolute difference (0-255 scale) under which frames are equal.
+    def __init__(self, size = (16, 16), threshold = 2.0):
+        self.size = size
+        self.threshold = threshold
+        self.last = None #Thumbnail of the reference frame
+        self.static_frames = 0 #Number of frames found identical to the reference
+        self.frames = 0
+
+    # Small grayscale thumbnail of a frame (PIL image or numpy array).
+    def signature(self, frame):
+        frame = np.asarray(frame)
+        rows = np.linspace(0, frame.shape[0] - 1, self.size[0]).astype(np.intp)
+        cols = np.linspace(0, frame.shape[1] - 1, self.size[1]).astype(np.intp)
+        thumbnail = frame[rows[:, None], cols].astype(np.float32)
+        if thumbnail.ndim == 3:
+            thumbnail = thumbnail[..., :3].mean(axis = 2)
+        if frame.dtype != np.uint8 and thumbnail.max() <= 1.0:
+            thumbnail *= 255
+        return thumbnail
+
+    # True if the frame is the same as the reference one, else the frame becomes the new reference.
+    # The reference is kept while frames are static, so a slow change adds up until it is detected.
+    def is_static(self, frame):
+        signature = self.signature(frame)
+        static = (self.last is not None and self.last.shape == signature.shape
+                  and float(np.abs(signature - self.last).mean()) < self.threshold)
+        if not static:
+            self.last = signature
+        self.frames += 1
+        if static:
+            self.static_frames += 1
+        return static
+
+    # Forget the previous frame, e.g. after a click that changes the screen.
+    def reset(self):
+        self.last = None
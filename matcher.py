@@ -0,0 +1,96 @@
+# Template matching engine used to find the start/play buttons on the screen.
+# Templates are loaded and converted to grayscale once, and resized to every search scale up front.
+# One call to match returns the best score over all the scales, so checking a confidence
+# level is a comparison instead of a new search of the screen.
+# By default only the template size is searched: the confidence levels of start_game and env are tuned for it,
+# smaller scales give scores above them on screens without the button (see bench_matcher.py).
+
+import os
+import numpy as np
+import cv2
+from backends import Box, Match
+
+SCALES = (1.0,) #Template sizes tried by default, relative to the template image
+MULTI_SCALES = (0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.25, 1.4) #Opt-in search over sizes, needs its own confidence levels
+COARSE = 0.5 #Downsampling used for the coarse search over the scales
+
+# Convert a screenshot (PIL image or numpy array, RGB/RGBA/gray) to a grayscale uint8 array.
+def to_gray(image):
+    image = np.asarray(image)
+    if image.ndim == 2:
+        gray = image
+    elif image.shape[2] == 4:
+        gray = cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY)
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    if gray.dtype != np.uint8:
+        gray = (gray * 255).astype(np.uint8) if gray.max() <= 1.0 else gray.astype(np.uint8)
+    return gray
+
+class TemplateMatcher:
+
+    def __init__(self, template, scales = SCALES, coarse = COARSE):
+        if isinstance(template, (str, os.PathLike)):
+            image = cv2.imread(str(template), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                raise FileNotFoundError("Could not read template: %s" % template)
+        else:
+            image = to_gray(template)
+        self.template = image
+        self.coarse = coarse
+        # Pyramid: for each scale, the template at full resolution and downsampled for the coarse search
+        self.pyramid = []
+        for scale in scales:
+            full = self._resize(image, scale)
+            small = self._resize(image, scale * coarse)
+            if min(full.shape) >= 4 and min(small.shape) >= 2:
+                self.pyramid.append((scale, full, small))
+
+    # Templates and screens are resized with the same rounding, so a template the size of the screen still fits.
+    def _resize(self, image, scale):
+        height = max(int(round(image.shape[0] * scale)), 1)
+        width = max(int(round(image.shape[1] * scale)), 1)
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        return cv2.resize(image, (width, height), interpolation = interpolation)
+
+    # Best match of the template in the screen, over all the scales.
+    # offset is the (left, top) of the screenshot on the screen, so the box is in screen coordinates.
+    # Returns Match(score, box, scale), with box None if the template does not fit in the screen.
+    def match(self, screen, offset = (0, 0)):
+        gray = to_gray(screen)
+        small = self._resize(gray, self.coarse)
+        # Coarse search: every scale on the downsampled screen
+        best = None
+        for scale, full, template in self.pyramid:
+            if template.shape[0] > small.shape[0] or template.shape[1] > small.shape[1]:
+                continue
+            _, score, _, location = cv2.minMaxLoc(cv2.matchTemplate(small, template, cv2.TM_CCOEFF_NORMED))
+            if best is None or score > best[0]:
+                best = (score, scale, full, location)
+        if best is None:
+            return Match(0.0, None, None)
+        # Fine search: best scale at full resolution, around the coarse location
+        score, scale, template, location = best
+        height, width = template.shape
+        margin = int(round(2 / self.coarse)) + 2
+        left = max(int(location[0] / self.coarse) - margin, 0)
+        top = max(int(location[1] / self.coarse) - margin, 0)
+        right = min(left + width + 2 * margin, gray.shape[1])
+        bottom = min(top + height + 2 * margin, gray.shape[0])
+        if right - left >= width and bottom - top >= height:
+            _, score, _, location = cv2.minMaxLoc(
+                cv2.matchTemplate(gray[top:bottom, left:right], template, cv2.TM_CCOEFF_NORMED))
+            location = (left + location[0], top + location[1])
+        else:
+            location = (int(location[0] / self.coarse), int(location[1] / self.coarse))
+        box = Box(int(offset[0] + location[0]), int(offset[1] + location[1]), width, height)
+        return Match(float(score), box, scale)
+
+_matchers = {}
+
+# Shared matcher for a template file and scales, loaded once per process.
+def get_matcher(path, scales = SCALES):
+    key = (os.path.abspath(str(path)), tuple(scales))
+    if key not in _matchers:
+        _matchers[key] = TemplateMatcher(key[0], scales = key[1])
+    return _matchers[key]
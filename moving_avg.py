@@ -1,26 +1,83 @@
 #ll Return the moving average of last 100 observations.
 # To gauge the performance of our model in the last 100 steps at the end of every epoch.
 # 100 is a random number , can be anything.
+# The rewards are kept in a numpy ring buffer with a running sum, so adding a reward and reading the average are O(1).
 
 import numpy as np
 
 # Making the moving average on 100 steps
 class MA:
-    def __init__(self, size):
+    def __init__(self, size, alpha = None):
         self.size = size #Size of moving average
-        self.list_of_rewards = []
-        
+        self.alpha = alpha if alpha is not None else 2.0 / (size + 1) #Smoothing factor of the exponential moving average
+        self.rewards = np.zeros(size, dtype = np.float64) #Ring buffer
+        self.index = 0 #Position of the next reward in the ring buffer
+        self.count = 0 #Number of rewards in the window
+        self.total = 0.0 #Running sum of the window
+        self.ema_value = None
 
-    # Function to Calculate average and return 
+    # Function to Calculate average and return
     def average(self):
-        return np.mean(self.list_of_rewards)
+        if self.count == 0:
+            return np.nan
+        return self.total / self.count
 
     # Function to Append rewards to the list of rewards.
     def add(self, rewards):
-        if isinstance(rewards, list):
-            self.list_of_rewards = self.list_of_rewards + rewards
+        if isinstance(rewards, (list, tuple, np.ndarray)):
+            for reward in rewards:
+                self._add(float(reward))
         else:
-            self.list_of_rewards.append(rewards)
-        # Removing elements from beginning if no of elements > size
-        while len(self.list_of_rewards) > self.size:
-            del self.list_of_rewards[0]
+            self._add(float(rewards))
+
+    def _add(self, reward):
+        if self.count == self.size:
+            self.total -= self.rewards[self.index] #Removing the oldest reward from the sum
+        else:
+            self.count += 1
+        self.rewards[self.index] = reward
+        self.total += reward
+        self.index = (self.index + 1) % self.size
+        if self.index == 0: #Recomputing the sum once per lap to avoid accumulating rounding errors
+            self.total = float(self.rewards[:self.count].sum())
+        self.ema_value = reward if self.ema_value is None else self.ema_value + self.alpha * (reward - self.ema_value)
+
+    # Rewards of the window, oldest first.
+    def values(self):
+        if self.count < self.size:
+            return self.rewards[:self.count].copy()
+        return np.concatenate((self.rewards[self.index:], self.rewards[:self.index]))
+
+    def __len__(self):
+        return self.count
+
+    # Statistics over the window.
+    def min(self):
+        return self.rewards[:self.count].min() if self.count else np.nan
+
+    def max(self):
+        return self.rewards[:self.count].max() if self.count else np.nan
+
+    def percentile(self, q):
+        return np.percentile(self.rewards[:self.count], q) if self.count else np.nan
+
+    # Exponential moving average of every reward added so far.
+    def ema(self):
+        return self.ema_value if self.ema_value is not None else np.nan
+
+    # All the statistics in one dictionary, to be printed or exported with the other metrics.
+    def summary(self):
+        p50, p90 = self.percentile([50, 90]) if self.count else (np.nan, np.nan)
+        return {'count': self.count, 'average': self.average(), 'min': self.min(), 'max': self.max(),
+                'p50': p50, 'p90': p90, 'ema': self.ema()}
+
+    # Functions used by the checkpoint manager to save and restore the window.
+    def state_dict(self):
+        return {'size': self.size, 'rewards': self.values().tolist(), 'ema': self.ema_value}
+
+    def load_state_dict(self, state):
+        self.__init__(state['size'], self.alpha)
+        ema = state.get('ema')
+        self.add(list(state['rewards'])[-self.size:])
+        if ema is not None:
+            self.ema_value = ema
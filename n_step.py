@@ -5,19 +5,66 @@ import numpy as np
 
 Step = namedtuple('Step', ['state', 'action', 'reward', 'done', 'lstm'])
 
+# Steps of one game, each step is appended once and shared by all the windows over it.
+class Episode:
+    def __init__(self):
+        self.steps = []
+
+    def __len__(self):
+        return len(self.steps)
+
+    def append(self, step):
+        self.steps.append(step)
+
+    # Keep only the first 'length' steps
+    def truncate(self, length):
+        del self.steps[length:]
+
+# View of 'length' consecutive steps of an episode, used as a sample by the replay memory.
+# Behaves like the tuple of steps it replaces (len, indexing, slicing, iteration) without copying them.
+class Window:
+    __slots__ = ('episode', 'start', 'length')
+
+    def __init__(self, episode, start, length):
+        self.episode = episode
+        self.start = start
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.episode.steps[self.start + i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("window index out of range")
+        return self.episode.steps[self.start + index]
+
+    def __iter__(self):
+        return iter(self.episode.steps[self.start:self.start + self.length])
+
 class NStepProgress:
-    def __init__(self, env, ai, n_step):
+    # death_lag: at game over, the transition death_lag frames before the fatal one becomes the terminal one and
+    # the frames after it are removed (the game only shows game over a few frames after the mistake). 0 disables it.
+    def __init__(self, env, ai, n_step, death_lag = 2):
         self.ai = ai  # ai object
         self.rewards = []
         self.env = env  # Importing our manual subway surfers environment
         self.n_step = n_step  # Number of steps to look forward
+        self.death_lag = death_lag
+        self.steps = 0  # Number of actions taken in the environment
+        self.skipped_forwards = 0  # Forward passes avoided because the frame did not change
 
     def __iter__(self):  # Function to play game and collect/return samples
         state = self.env.reset()  # Resetting the game
-        history = deque()
+        episode = Episode()
+        emitted = self.n_step - 1  # Last step index that ended a yielded window
         reward = 0.0  # Initial reward = 0
         is_done = True
-        end_buffer = []  # To remove unwanted images
+        recent = deque(maxlen = self.death_lag + 1)  # Last frames, to remove unwanted images
+        static = False  # The env reported the same frame as the previous step
 
         while True:
             if is_done:
@@ -27,11 +74,12 @@ class NStepProgress:
                 cx = Variable(cx.data)
                 hx = Variable(hx.data)
 
-            action, (hx, cx) = self.ai(Variable(torch.from_numpy(np.array([state], dtype=np.float32))), (hx, cx))
-            end_buffer.append((state, action))
-
-            while len(end_buffer) > 3:
-                del end_buffer[0]
+            if static and not is_done and recent and recent[-1][0] is state:
+                action = recent[-1][1]  # Same frame as before: same decision, no forward pass
+                self.skipped_forwards += 1
+            else:
+                action, (hx, cx) = self.ai(Variable(torch.from_numpy(np.array([state], dtype=np.float32))), (hx, cx))
+            recent.append((state, action))
 
             # Printing action output
             t = action[0][0]
@@ -47,37 +95,37 @@ class NStepProgress:
                 print("do nothing")
 
             # Taking Action
-            next_state, r, is_done, _ = self.env.step(action)
+            next_state, r, is_done, info = self.env.step(action)
+            static = info.get('static', False)
+            self.steps += 1
 
             # If game over
             if is_done:
                 print("\nGame Ended\n")
-                if len(end_buffer) >= 3:
-                    state, action = end_buffer[-3]
-                    history.pop()  # Removing unwanted experience
+                if self.death_lag and len(recent) > self.death_lag:
+                    state, action = recent[0]
+                    episode.truncate(len(episode) - self.death_lag)  # Removing unwanted experience
                 r = -10
             reward += r
-            history.append(Step(state=state, action=action, reward=r, done=is_done, lstm=(hx, cx)))
+            episode.append(Step(state=state, action=action, reward=r, done=is_done, lstm=(hx, cx)))
 
             # Returning the experiences to the replay memory
-            while len(history) > self.n_step + 1:
-                history.popleft()
-
-            if len(history) == self.n_step + 1:
-                yield tuple(history)
+            # Windows are only yielded once the steps they cover can no longer be removed at game over
+            last = len(episode) - 1 if is_done else len(episode) - 1 - self.death_lag
+            while emitted < last:
+                emitted += 1
+                yield Window(episode, emitted - self.n_step, self.n_step + 1)
 
             state = next_state
             if is_done:
-                if len(history) > self.n_step + 1:
-                    history.popleft()
-                while len(history) >= 1:
-                    yield tuple(history)
-                    history.popleft()
+                for start in range(max(len(episode) - self.n_step, 0), len(episode)):
+                    yield Window(episode, start, len(episode) - start)
                 self.rewards.append(reward)
                 reward = 0.0
                 state = self.env.reset()
-                end_buffer = []
-                history.clear()
+                episode = Episode()
+                emitted = self.n_step - 1
+                recent.clear()
 
     def rewards_steps(self):
         rewards_steps = self.rewards
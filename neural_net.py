@@ -3,8 +3,6 @@
 # Importing the librariess
 import numpy as np
 from torch.autograd import Variable
-import matplotlib.pyplot as pyplot
-import pandas as pd
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -51,19 +49,45 @@ class AI:
         self.brain = brain
         self.body = body
 # Returns the output of Softmax multinomial function and LSTM layer
+# Inputs can hold one state per environment, the body returns one action per row.
     def __call__(self, inputs, hidden):
-        output, (hx, cx) = self.brain(inputs,hidden)
-        actions = self.body(output)
+        with torch.no_grad(): #Acting only, no gradients needed
+            output, (hx, cx) = self.brain(inputs,hidden)
+            actions = self.body(output)
         return actions.data.cpu().numpy(), (hx, cx)
 
-# Body of the softmax function.
-class SoftmaxBody(nn.Module):
-    
-    def __init__(self, T):
-        super(SoftmaxBody, self).__init__()
+# Batched action selection, one action per row of Q values (one row per environment).
+# Sampling is done on the tensor with the Gumbel-max trick: argmax(Q * T + Gumbel noise) is distributed as softmax(Q * T).
+# Modes: 'boltzmann' (softmax sampling with temperature T), 'epsilon' (epsilon-greedy) and 'greedy'.
+class ActionSelector(nn.Module):
+
+    def __init__(self, T = 1.0, mode = 'boltzmann', epsilon = 0.05):
+        super(ActionSelector, self).__init__()
+        if mode not in ('boltzmann', 'epsilon', 'greedy'):
+            raise ValueError("Unknown action selection mode: %s" % mode)
         self.T = T #Used for random exploration (the higher the T the lower the exploration)
+        self.mode = mode
+        self.epsilon = epsilon #Probability of a random action in epsilon-greedy mode
 
+    # Takes Q values of shape (N, number_actions) and returns actions of shape (N, 1).
     def forward(self, outputs):
-        probs = F.softmax(outputs * self.T,dim = 0) 
-        actions = probs.multinomial(num_samples=1)  # Final action to perform
+        outputs = outputs.detach()
+        if outputs.dim() == 1:
+            outputs = outputs.unsqueeze(0)
+        if self.mode == 'boltzmann':
+            gumbel = -torch.empty_like(outputs).exponential_().log() #-log(Exp(1)) follows a Gumbel distribution
+            actions = (outputs * self.T + gumbel).argmax(dim = 1, keepdim = True)
+        else:
+            actions = outputs.argmax(dim = 1, keepdim = True)
+            if self.mode == 'epsilon' and self.epsilon > 0:
+                random_actions = torch.randint_like(actions, outputs.size(1))
+                explore = torch.rand(actions.shape, device = outputs.device) < self.epsilon
+                actions = torch.where(explore, random_actions, actions)
         return actions
+
+# Body of the softmax function.
+# Softmax is taken over the actions of each row, so it works with any batch size.
+class SoftmaxBody(ActionSelector):
+
+    def __init__(self, T):
+        super(SoftmaxBody, self).__init__(T = T, mode = 'boltzmann')
@@ -1,13 +1,15 @@
 # Enhanced preprocessing with debugging capabilities
 
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.image as img
-from skimage.transform import resize
-import cv2
 import os
 import time
 
+# skimage, cv2 and matplotlib are slow to import, so they are only imported when first needed.
+# The training path only needs resize, the plotting libraries are only used for debugging.
+def resize(image, output_shape):
+    from skimage.transform import resize as skimage_resize
+    return skimage_resize(image, output_shape)
+
 class EnhancedPreprocessor:
     def __init__(self, debug_mode=False):
         self.debug_mode = debug_mode
@@ -82,6 +84,7 @@ class EnhancedPreprocessor:
         img_normalized = ((image - image.min()) / (image.max() - image.min()) * 255).astype(np.uint8)
         
         # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
+        import cv2
         clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
         img_enhanced = clahe.apply(img_normalized)
         
@@ -90,6 +93,7 @@ class EnhancedPreprocessor:
     
     def save_debug_image(self, image, filename, cmap=None):
         """Save debug image to disk"""
+        import matplotlib.pyplot as plt
         filepath = os.path.join(self.debug_folder, f"{int(time.time())}_{filename}")
         
         plt.figure(figsize=(8, 8))
@@ -105,6 +109,7 @@ class EnhancedPreprocessor:
     
     def compare_preprocessing_methods(self, image):
         """Compare original vs enhanced preprocessing"""
+        import matplotlib.pyplot as plt
         print("Comparing preprocessing methods...")
         
         # Original method
@@ -152,6 +157,7 @@ def preprocess_image(img):
 # Debug function to test your current preprocessing
 def debug_current_preprocessing():
     """Debug the current preprocessing pipeline"""
+    import matplotlib.image as img
     print("=== Preprocessing Debug ===")
     
     # Create enhanced preprocessor with debug mode
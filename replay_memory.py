@@ -5,6 +5,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
 from collections import deque
+from n_step import Episode, Step, Window
 
 # Saving the tuple of previous state, action, reward and next state, i.e Agent's experiences and storing them in a buffer.
 class ReplayMemory:
@@ -17,6 +18,7 @@ class ReplayMemory:
         self.n_steps = n_steps #Object of n_steps
 
     # Run the agent for 'n' steps, collect and save the experience in the buffer.
+    # Entries are n_step.Window views, the steps themselves are stored once in their episode.
     def run_steps(self, samples): 
         while samples > 0:
             samples -= 1
@@ -34,4 +36,38 @@ class ReplayMemory:
             yield vals[offset*batch_size:(offset+1)*batch_size]
             offset += 1
 
+    # Cheap copy of the buffer, taken on the training thread before a checkpoint.
+    # Only the lists of steps are copied (the states are shared), compact() does the conversion later.
+    def snapshot(self):
+        episodes = []
+        index = {}
+        windows = []
+        for window in self.buffer:
+            if id(window.episode) not in index:
+                index[id(window.episode)] = len(episodes)
+                episodes.append(list(window.episode.steps))
+            windows.append((index[id(window.episode)], window.start, window.length))
+        return {'capacity': self.capacity, 'episodes': episodes, 'windows': windows}
 
+    # Compact copy of the buffer for checkpoints, built from a snapshot (can run in the checkpoint writer thread).
+    # Entries are windows over shared episodes, so each episode is stored once and windows keep (episode, start, length).
+    # States are stored as float16 and the LSTM states are dropped (they are not used for training).
+    @staticmethod
+    def compact(snapshot):
+        episodes = [[(np.asarray(step.state, dtype = np.float16), step.action, step.reward, step.done) for step in steps]
+                    for steps in snapshot['episodes']]
+        return {'capacity': snapshot['capacity'], 'episodes': episodes, 'windows': snapshot['windows']}
+
+    def state_dict(self):
+        return self.compact(self.snapshot())
+
+    def load_state_dict(self, state):
+        episodes = []
+        for steps in state['episodes']:
+            episode = Episode()
+            for s, a, r, d in steps:
+                episode.append(Step(state = s.astype(np.float32), action = a, reward = r, done = d, lstm = None))
+            episodes.append(episode)
+        self.buffer = deque(Window(episodes[i], start, length) for i, start, length in state['windows'])
+        while len(self.buffer) > self.capacity:
+            self.buffer.popleft()
@@ -0,0 +1,142 @@
+# Runtime configuration of the torch thread pools and CPU affinity, separately for acting and learning.
+# Acting runs the CNN on one frame at a time and learning on minibatches, so they do not want the same
+# number of threads, and they should not fight for the same cores when they run in different processes.
+# Usage: python runtime.py --autotune [--max-threads N] [--pin]   measures CNN.forward and saves runtime_config.json
+
+import argparse
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import torch
+
+RUNTIME_FILE = Path(__file__).parent / 'runtime_config.json'
+ROLES = ('acting', 'learning')
+
+class RuntimeConfig:
+
+    # profiles: {role: {'threads': int or None, 'cpus': list of cpu ids or None}}, None leaves the setting unchanged.
+    # interop_threads: size of the torch inter-op pool, set once per process.
+    def __init__(self, profiles = None, interop_threads = None):
+        self.profiles = {role: {'threads': None, 'cpus': None} for role in ROLES}
+        for role, profile in (profiles or {}).items():
+            self.profiles[role] = dict(self.profiles.get(role, {}), **profile)
+        self.interop_threads = interop_threads
+        self.current = None #Role currently applied
+
+    # Same number of threads for every role, e.g. for runs sharing the machine in a sweep.
+    @classmethod
+    def fixed(cls, threads):
+        return cls({role: {'threads': threads} for role in ROLES}, interop_threads = 1)
+
+    @classmethod
+    def load(cls, path = RUNTIME_FILE):
+        if not os.path.isfile(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get('profiles'), data.get('interop_threads'))
+
+    def save(self, path = RUNTIME_FILE, measurements = None):
+        data = {'profiles': self.profiles, 'interop_threads': self.interop_threads}
+        if measurements is not None:
+            data['measurements'] = measurements
+        with open(path, 'w') as f:
+            json.dump(data, f, indent = 2)
+
+    # Process wide settings, call once at the start of the process.
+    def setup(self):
+        if self.interop_threads:
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError: #Can only be set before the first inter-op parallel work
+                pass
+
+    # Apply the thread count and CPU affinity of a role.
+    # The affinity is set for the calling process, so pinning is meant for processes that run a single role.
+    def apply(self, role):
+        profile = self.profiles[role]
+        if profile.get('threads'):
+            torch.set_num_threads(profile['threads'])
+        if profile.get('cpus') and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, profile['cpus'])
+        self.current = role
+
+    # Switch to a role for the duration of a block, e.g. acting while collecting steps then learning on the batches.
+    @contextmanager
+    def role(self, role):
+        previous_threads = torch.get_num_threads()
+        previous_cpus = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else None
+        previous_role = self.current
+        self.apply(role)
+        try:
+            yield self
+        finally:
+            torch.set_num_threads(previous_threads)
+            if previous_cpus is not None and self.profiles[role].get('cpus'):
+                os.sched_setaffinity(0, previous_cpus)
+            self.current = previous_role
+
+# Median latency in milliseconds of cnn.forward for a batch of frames.
+def forward_latency(cnn, batch_size, threads, repeats = 20, warmup = 3):
+    torch.set_num_threads(threads)
+    inputs = torch.rand(batch_size, 1, 128, 128)
+    hidden = (torch.zeros(batch_size, 256), torch.zeros(batch_size, 256))
+    times = []
+    with torch.no_grad():
+        for i in range(warmup + repeats):
+            start = time.perf_counter()
+            cnn(inputs, hidden)
+            if i >= warmup:
+                times.append(time.perf_counter() - start)
+    times.sort()
+    return 1000 * times[len(times) // 2]
+
+# Measure CNN.forward at batch 1 (acting) and batch 64 (learning) for several thread counts and keep the fastest.
+# With pin, acting gets the first cores and learning the next ones, for actor and learner processes.
+def autotune(cnn = None, thread_counts = None, repeats = 20, pin = False):
+    from neural_net import CNN
+    cnn = cnn or CNN(5)
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    thread_counts = thread_counts or (1, 2, 4, 8, 16, len(cpus))
+    thread_counts = sorted({t for t in thread_counts if 1 <= t <= len(cpus)}) or [1] #More threads than cores only measures noise
+    initial = torch.get_num_threads()
+    measurements = {}
+    for role, batch_size in (('acting', 1), ('learning', 64)):
+        measurements[role] = {}
+        for threads in thread_counts:
+            measurements[role][threads] = forward_latency(cnn, batch_size, threads, repeats = repeats)
+            print("%-8s batch %2d, %2d threads: %8.2f ms" % (role, batch_size, threads, measurements[role][threads]))
+    torch.set_num_threads(initial)
+    acting = min(measurements['acting'], key = measurements['acting'].get)
+    learning = min(measurements['learning'], key = measurements['learning'].get)
+    profiles = {'acting': {'threads': acting, 'cpus': None}, 'learning': {'threads': learning, 'cpus': None}}
+    if pin:
+        profiles['acting']['cpus'] = cpus[:acting]
+        rest = cpus[acting:]
+        if len(rest) >= learning:
+            profiles['learning']['cpus'] = rest[:learning]
+        else:
+            profiles['learning']['cpus'] = cpus[-learning:]
+            print("Warning: %d cores for %d acting and %d learning threads, acting and learning share cores %s"
+                  % (len(cpus), acting, learning, sorted(set(profiles['acting']['cpus']) & set(profiles['learning']['cpus']))))
+    print("Best: acting %d threads, learning %d threads" % (acting, learning))
+    return RuntimeConfig(profiles, interop_threads = 1), {role: {str(k): v for k, v in m.items()} for role, m in measurements.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Thread and CPU settings for acting and learning")
+    parser.add_argument('--autotune', action = 'store_true', help = "Measure CNN.forward and save the best settings")
+    parser.add_argument('--max-threads', type = int, default = None, help = "Largest thread count tried")
+    parser.add_argument('--pin', action = 'store_true', help = "Also assign separate cores to acting and learning")
+    args = parser.parse_args()
+    if args.autotune:
+        counts = None
+        if args.max_threads:
+            counts = sorted({t for t in (1, 2, 4, 8, 16, args.max_threads) if t <= args.max_threads})
+        config, measurements = autotune(thread_counts = counts, pin = args.pin)
+        config.save(measurements = measurements)
+        print("Saved to %s" % RUNTIME_FILE)
+    else:
+        config = RuntimeConfig.load()
+        print(json.dumps({'profiles': config.profiles, 'interop_threads': config.interop_threads}, indent = 2))
@@ -1,18 +1,36 @@
-import pyautogui
-import time
+import json
+import os
+import tempfile
 from pathlib import Path
+from backends import Box, BackendError, get_backend
 
-def begin():
+# The detected game region is cached here, so that later starts only check it instead of scanning the screen.
+CALIBRATION_FILE = Path(__file__).parent / 'calibration.json'
+ROI_MARGIN = 20  # Pixels added around the cached button boxes when checking them
+START_CONFIDENCE = 0.5  # Lowest template match score accepted for each button
+PLAY_CONFIDENCE = 0.4
+PLAY_WAIT_ATTEMPTS = 25  # Checks of the cached play button after clicking start, 0.2 seconds apart
+
+def begin(backend=None, use_cache=True):
     """
     1) Looks for the initial "Tap to Play" (start_t.png) and clicks it.
     2) Then waits for the in-game "Play" button (play.png) to appear.
     3) Returns the {top, left, width, height} of the game region.
+    The screen is read and clicked through the given backend (see backends.get_backend).
+    If a calibration from an earlier start matches the screen, only the cached button locations are checked.
     """
     print("Beginning game setup...")
+    backend = get_backend(backend)
     base = Path(__file__).parent / 'images'
     start_img = base / 'start_t.png'
     play_img  = base / 'play.png'
     
+    use_cache = use_cache and backend.cache_calibration
+    if use_cache:
+        region = begin_from_calibration(backend, start_img, play_img)
+        if region:
+            return region
+
     # Check if image files exist
     if not start_img.exists():
         print(f"ERROR: start_t.png not found at {start_img}")
@@ -33,29 +51,23 @@ def begin():
     
     while loc_start is None and attempts < max_attempts:
         try:
-            # Try different confidence levels
-            for confidence in [0.8, 0.7, 0.6, 0.5]:
-                try:
-                    loc_start = pyautogui.locateOnScreen(
-                        str(start_img),
-                        confidence=confidence,
-                        grayscale=True
-                    )
-                    if loc_start:
-                        print(f"Found start button with confidence {confidence}")
-                        break
-                except pyautogui.ImageNotFoundException:
-                    continue
+            # One search of the screen, the confidence level is checked on the best score
+            match_start = backend.match(str(start_img))
+            if match_start.box is not None and match_start.score >= START_CONFIDENCE:
+                loc_start = match_start.box
+                print(f"Found start button with score {match_start.score:.2f}")
                     
             if not loc_start:
                 print(f"Start button not found, attempt {attempts + 1}")
-                time.sleep(0.2)
+                backend.sleep(0.2)
                 attempts += 1
                 
+        except BackendError:
+            raise  # No display or input: retrying will not help
         except Exception as e:
             print(f"Error looking for start button: {e}")
             attempts += 1
-            time.sleep(0.2)
+            backend.sleep(0.2)
     
     if not loc_start:
         print("Could not find start button. Please manually start the game.")
@@ -63,10 +75,10 @@ def begin():
         return {'top': 100, 'left': 100, 'width': 400, 'height': 600}
     
     # Click the start button
-    center = pyautogui.center(loc_start)
+    center = backend.center(loc_start)
     print(f"Clicking start button at {center}")
-    pyautogui.click(center)
-    time.sleep(2.0)  # Wait longer for game to load
+    backend.click(*center)
+    backend.sleep(2.0)  # Wait longer for game to load
 
     # 2) Wait for the in-game "Play" button
     loc_play = None
@@ -75,29 +87,23 @@ def begin():
     
     while loc_play is None and attempts < max_attempts:
         try:
-            # Try different confidence levels
-            for confidence in [0.8, 0.7, 0.6, 0.5, 0.4]:
-                try:
-                    loc_play = pyautogui.locateOnScreen(
-                        str(play_img),
-                        confidence=confidence,
-                        grayscale=True
-                    )
-                    if loc_play:
-                        print(f"Found play button with confidence {confidence}")
-                        break
-                except pyautogui.ImageNotFoundException:
-                    continue
+            # One search of the screen, the confidence level is checked on the best score
+            match_play = backend.match(str(play_img))
+            if match_play.box is not None and match_play.score >= PLAY_CONFIDENCE:
+                loc_play = match_play.box
+                print(f"Found play button with score {match_play.score:.2f}")
                     
             if not loc_play:
                 print(f"Play button not found, attempt {attempts + 1}")
-                time.sleep(0.2)
+                backend.sleep(0.2)
                 attempts += 1
                 
+        except BackendError:
+            raise  # No display or input: retrying will not help
         except Exception as e:
             print(f"Error looking for play button: {e}")
             attempts += 1
-            time.sleep(0.2)
+            backend.sleep(0.2)
 
     if not loc_play:
         print("Could not find play button. Using start button location as reference.")
@@ -121,4 +127,104 @@ def begin():
     
     print(f"Game area detected: top={top}, left={left}, width={width}, height={height}")
     
-    return {'top': top, 'left': left, 'width': width, 'height': height}
\ No newline at end of file
+    region = {'top': top, 'left': left, 'width': width, 'height': height}
+    if use_cache:
+        save_calibration(backend, region, {
+            'start': {'box': list(loc_start), 'score': match_start.score},
+            'play': {'box': list(loc_play), 'score': match_play.score},
+        })
+    return region
+
+def fingerprint(backend, templates):
+    """Screen geometry and template files the calibration is valid for."""
+    return {
+        'screen': list(backend.size()),
+        'templates': {Path(t).name: [Path(t).stat().st_size, Path(t).stat().st_mtime_ns] for t in templates},
+    }
+
+def save_calibration(backend, region, matches, path=CALIBRATION_FILE):
+    """Store the game region and the button matches with the current screen fingerprint."""
+    calibration = {
+        'fingerprint': fingerprint(backend, [Path(__file__).parent / 'images' / n for n in ('start_t.png', 'play.png')]),
+        'region': region,
+        'matches': matches,
+    }
+    try:
+        # Written to a temporary file and renamed, so parallel starts never read a partial file
+        fd, tmp = tempfile.mkstemp(dir=Path(path).parent, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(calibration, f, indent=2)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not save calibration: {e}")
+
+def load_calibration(backend, templates, path=CALIBRATION_FILE):
+    """Return the cached calibration, or None if missing or made for another screen/templates."""
+    try:
+        with open(path) as f:
+            calibration = json.load(f)
+        if calibration.get('fingerprint') != fingerprint(backend, templates):
+            print("Calibration is for another screen setup, ignoring it")
+            return None
+        return calibration
+    except (OSError, ValueError):
+        return None
+
+def _roi(box, screen_size):
+    """Cached button box grown by ROI_MARGIN and clipped to the screen."""
+    left = max(box[0] - ROI_MARGIN, 0)
+    top = max(box[1] - ROI_MARGIN, 0)
+    right = min(box[0] + box[2] + ROI_MARGIN, screen_size[0])
+    bottom = min(box[1] + box[3] + ROI_MARGIN, screen_size[1])
+    return Box(left, top, right - left, bottom - top)
+
+def begin_from_calibration(backend, start_img, play_img):
+    """
+    Check the cached button locations with one match each, limited to their region.
+    Clicks the start button if it is there and waits for the play button, or accepts the play button
+    if the game is already started.
+    Returns the cached game region, or None when the full search is needed.
+    """
+    if not start_img.exists() or not play_img.exists():
+        return None
+    calibration = load_calibration(backend, [start_img, play_img])
+    if calibration is None:
+        return None
+    screen_size = backend.size()
+    matches = calibration['matches']
+    try:
+        loc_start = backend.locate(
+            str(start_img),
+            confidence=START_CONFIDENCE,
+            grayscale=True,
+            region=_roi(matches['start']['box'], screen_size)
+        )
+        if loc_start:
+            center = backend.center(loc_start)
+            print(f"Found start button at cached location, clicking at {center}")
+            backend.click(*center)
+            # Wait for the game to load, checking only the cached play button region
+            play_roi = _roi(matches['play']['box'], screen_size)
+            for attempt in range(PLAY_WAIT_ATTEMPTS):
+                backend.sleep(0.2)
+                if backend.locate(str(play_img), confidence=PLAY_CONFIDENCE, grayscale=True, region=play_roi):
+                    print("Found play button at cached location")
+                    break
+            else:
+                print("Play button did not appear at cached location, continuing with the cached region")
+            return calibration['region']
+        loc_play = backend.locate(
+            str(play_img),
+            confidence=PLAY_CONFIDENCE,
+            grayscale=True,
+            region=_roi(matches['play']['box'], screen_size)
+        )
+        if loc_play:
+            print("Found play button at cached location, game already started")
+            return calibration['region']
+    except BackendError:
+        raise
+    except Exception as e:
+        print(f"Error checking cached calibration: {e}")
+    print("Cached calibration did not match, scanning the screen...")
+    return None
\ No newline at end of file
@@ -0,0 +1,169 @@
+# Hyperparameter sweep: trains one AI per combination of settings and seed, in parallel worker processes,
+# against a simulated game (no desktop needed), and compares how fast they learn.
+# The default game is backends.ObstacleBackend, where the length of a run depends on the actions. On the plain
+# 'stub' backend runs end after a random number of frames whatever the agent does, so only the speeds are compared.
+# Usage: python sweep.py [config.json] [--workers N] [--out sweep_results.csv]
+# The config is a JSON file like EXAMPLE_CONFIG: "base" overrides ai.DEFAULTS for every run,
+# every combination of the "grid" values is trained once per seed.
+
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+EXAMPLE_CONFIG = {
+    'base': {'nb_epochs': 30, 'capacity': 5000, 'batch_size': 64, 'steps_per_epoch': 128},
+    'grid': {'lr': [0.005, 0.001], 'T': [10, 50], 'n_step': [3, 7]},
+    'seeds': [0, 1],
+    'threads': 1, #torch threads per run
+    'max_seconds': 600, #Wall clock limit per run
+    'env': {'backend': 'obstacles', 'density': 0.5}, #Simulated game: backend name and its options (see backends.py)
+}
+
+MILESTONES = (20, 50, 100) #Average rewards checked by ai.train
+
+# Every run of the sweep: one dictionary per combination of grid values and seed.
+def make_jobs(config):
+    grid = config.get('grid', {})
+    names = sorted(grid)
+    jobs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        for seed in config.get('seeds', [0]):
+            jobs.append({'id': len(jobs), 'params': params, 'seed': seed,
+                         'config': dict(config.get('base', {}), **params),
+                         'max_seconds': config.get('max_seconds'), 'env': config.get('env', {})})
+    return jobs
+
+# Runs before torch is imported in each worker, so the OpenMP/MKL pools get the right size.
+def init_worker(threads):
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[name] = str(threads)
+
+# Train one run in a worker process and return its history.
+def run_job(job, threads):
+    import numpy as np
+    import torch
+    import ai
+    from backends import get_backend
+    from runtime import RuntimeConfig
+    runtime = RuntimeConfig.fixed(threads) #Every run keeps to its share of the machine
+    random.seed(job['seed'])
+    np.random.seed(job['seed'])
+    torch.manual_seed(job['seed'])
+    env_options = dict(job['env'])
+    name = env_options.pop('backend', 'obstacles')
+    if 'episode_length' in env_options:
+        env_options['episode_length'] = tuple(env_options['episode_length'])
+    backend = get_backend(name, seed = job['seed'], **env_options)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull): #Training prints every action
+        history = ai.train(job['config'], backend = backend, checkpoint_dir = None, max_seconds = job['max_seconds'],
+                           runtime = runtime)
+    return dict(job, history = history)
+
+# One row of the results table for a finished run.
+def summarize(result):
+    history = result['history']
+    last = history[-1] if history else {'time': 0.0, 'steps': 0, 'steps_per_second': 0.0, 'avg_reward': float('nan')}
+    row = {'id': result['id'], 'seed': result['seed']}
+    row.update(result['params'])
+    row.update({'epochs': len(history), 'time': last['time'], 'steps': last['steps'],
+                'steps_per_second': last['steps_per_second'], 'final_reward': last['avg_reward'],
+                'best_reward': max((h['avg_reward'] for h in history if h['avg_reward'] == h['avg_reward']), default = float('nan'))})
+    for milestone in MILESTONES:
+        reached = [h['time'] for h in history if h['avg_reward'] >= milestone]
+        row['time_to_%d' % milestone] = reached[0] if reached else None
+    return row
+
+# Whether the rewards of the simulated game depend on the agent, i.e. whether they can be compared.
+def rewards_comparable(config):
+    return config.get('env', {}).get('backend', 'obstacles') != 'stub'
+
+# Fastest runs first: highest milestone reached, then time to reach it.
+def sort_key(row):
+    for milestone in reversed(MILESTONES):
+        if row['time_to_%d' % milestone] is not None:
+            return (-milestone, row['time_to_%d' % milestone])
+    return (0, -row['best_reward'] if row['best_reward'] == row['best_reward'] else 0)
+
+# params: names of the swept hyperparameters, printed in full (metrics are rounded to 2 decimals).
+def print_table(rows, params = ()):
+    columns = list(rows[0].keys())
+    def cell(column, value):
+        if value is None:
+            return "-"
+        if isinstance(value, float):
+            return "%g" % value if column in params else "%.2f" % value
+        return value
+    print(" ".join("%12s" % column[:12] for column in columns))
+    for row in rows:
+        print(" ".join("%12s" % cell(c, row[c]) for c in columns))
+
+# Fastest runs first, for sweeps whose rewards cannot be compared.
+def throughput_key(row):
+    return -row['steps_per_second']
+
+# Reward vs wall clock of every run, one line per epoch.
+def write_curves(results, path):
+    with open(path, 'w', newline = '') as f:
+        writer = None
+        for result in sorted(results, key = lambda r: r['id']):
+            for h in result['history']:
+                line = dict({'id': result['id'], 'seed': result['seed']}, **result['params'])
+                line.update(h)
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames = list(line.keys()))
+                    writer.writeheader()
+                writer.writerow(line)
+
+def sweep(config, workers = None, out = 'sweep_results.csv'):
+    jobs = make_jobs(config)
+    threads = config.get('threads', 1)
+    workers = workers or max((os.cpu_count() or 1) // threads, 1)
+    print("Running %d trainings on %d workers (%d threads each)" % (len(jobs), workers, threads))
+    results = []
+    context = multiprocessing.get_context('spawn') #Fresh interpreters, so the thread settings apply before torch starts
+    with ProcessPoolExecutor(max_workers = workers, mp_context = context, initializer = init_worker,
+                             initargs = (threads,)) as pool:
+        futures = {pool.submit(run_job, job, threads): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print("Run %d %s failed: %s" % (job['id'], job['params'], e))
+                continue
+            results.append(result)
+            row = summarize(result)
+            print("Run %d %s seed %d: %d epochs, %.1f steps/s, final reward %.2f"
+                  % (row['id'], job['params'], job['seed'], row['epochs'], row['steps_per_second'], row['final_reward']))
+    if not results:
+        return []
+    if rewards_comparable(config):
+        rows = sorted((summarize(result) for result in results), key = sort_key)
+    else:
+        print("Note: on the stub backend runs end at random whatever the actions, rewards and milestones are noise."
+              " Runs are ranked by steps/s only.")
+        rows = sorted((summarize(result) for result in results), key = throughput_key)
+    print_table(rows, params = config.get('grid', {}))
+    if out:
+        write_curves(results, out)
+        print("Reward vs wall clock curves saved to %s" % out)
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Hyperparameter sweep on the simulated game")
+    parser.add_argument('config', nargs = '?', help = "JSON sweep config (default: EXAMPLE_CONFIG)")
+    parser.add_argument('--workers', type = int, default = None, help = "Number of worker processes")
+    parser.add_argument('--out', default = 'sweep_results.csv', help = "CSV file of the reward curves")
+    args = parser.parse_args()
+    config = EXAMPLE_CONFIG
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    sweep(config, workers = args.workers, out = args.out)